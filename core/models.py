@@ -1,16 +1,32 @@
 from __future__ import annotations
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, MISSING
 from typing import List, Literal, Optional
 
 @dataclass
 class GameState:
     """
     Tracks the current turn, phase, narrative history, available options,
-    and most recent player choice.
+    most recent player choice and the rolling summaries of older turns.
     """
     turn: int = 0
     phase: Literal["start", "intro", "choice", "dm_response"] = "start"
     intro_text: Optional[str] = None
-    story: List[str] = field(default_factory=list)         # DM and Player lines
+    story: List[str] = field(default_factory=list)         # latest DM and Player lines, the rest is in the story log
     current_options: List[str] = field(default_factory=list)
     last_choice: Optional[str] = None
+    chapters: List[str] = field(default_factory=list)       # summaries of K turns each
+    arc_summary: Optional[str] = None                        # summary of all chapters folded so far
+    summarized_lines: int = 0                                # story lines already folded into chapters
+    arc_chapters: int = 0                                    # chapters already folded into the arc
+    story_offset: int = 0                                    # story lines no longer held in memory
+
+    @property
+    def story_length(self) -> int:
+        return self.story_offset + len(self.story)
+
+    def __setstate__(self, state):
+        # Game states pickled before a field existed get its default
+        for f in fields(self):
+            if f.name not in state:
+                state[f.name] = f.default_factory() if f.default_factory is not MISSING else f.default
+        self.__dict__.update(state)
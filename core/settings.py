@@ -1,14 +1,37 @@
 import logging
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 from pydantic_settings import BaseSettings
-from pydantic import HttpUrl
+from pydantic import BaseModel, Field, HttpUrl
 
 logger = logging.getLogger(__name__)
 
 
+TASKS = ("rewrite", "options", "character", "dm_turn", "ask_dm", "intro", "summary")
+
+
+class TaskModel(BaseModel):
+    """
+    Model routing for a single LLM task. Unset fields fall back to the main model settings.
+    """
+    model: Optional[str] = None
+    context_size: Optional[int] = None
+    options: Dict[str, Any] = Field(default_factory=dict)
+    keep_alive: Optional[str] = None
+    fallback: bool = True  # retry on the main model when the output fails validation
+
+
 class Settings(BaseSettings):
     llm_host: str = "http://127.0.0.1:11434"
+    llm_hosts: List[str] = Field(default_factory=list)  # pool of hosts, overrides llm_host when set
+    llm_health_interval: float = 15.0
+    llm_breaker_failures: int = 3
+    llm_breaker_cooldown: float = 30.0
+    llm_hedge_tasks: List[str] = Field(default_factory=lambda: ["rewrite", "options"])
+    llm_hedge_delay: float = 0.5
+    llm_request_timeout: float = 120.0  # seconds, a timed out request counts as a host failure
+    llm_probe_timeout: float = 5.0
     llm_model: str = "gemma3"
     llm_embedding_model: str = "embeddinggemma:latest"
     pdf_folder: Path = Path("pdf")
@@ -21,11 +44,35 @@ class Settings(BaseSettings):
     player_count: int = 4
     context_size: int = 16384
     game_state: Path = Path("game_state")
+    enable_summaries: bool = True
+    summary_turns: int = 5  # turns folded into one chapter summary
+    summary_chapters: int = 4  # chapter summaries folded into the arc summary
+    summary_token_budget: int = 800  # prompt budget for arc and chapter summaries
+    story_memory_lines: int = 20  # story lines kept in memory, older ones are read from the story log
+    log_page_size: int = 20
+    combined_turn: bool = True
+    llm_keep_alive: str = "30m"
+    llm_max_loaded_models: int = 2
+    task_models: Dict[str, TaskModel] = Field(default_factory=lambda: {task: TaskModel() for task in TASKS})
 
     class Config:
         env_file = ".env"
         validate_assignment = True
 
+    def task_model(self, task: Optional[str] = None) -> TaskModel:
+        """
+        Resolve the routing of a task, filling unset fields from the main model.
+        """
+        route = self.task_models.get(task) if task else None
+        route = route or TaskModel()
+        return TaskModel(
+            model=route.model or self.llm_model,
+            context_size=route.context_size or self.context_size,
+            options=dict(route.options),
+            keep_alive=route.keep_alive or self.llm_keep_alive,
+            fallback=route.fallback,
+        )
+
 
 settings = Settings()
 
@@ -1,10 +1,14 @@
-import logging, re, os, pickle
+import logging, re, os, pickle, json, struct, sys
+from typing import List
 from .settings import settings
 from services.chromadb_client import chromadb_client
 logger = logging.getLogger(__name__)
 
 game_state_file = settings.game_state / "game_state.pkl"
 party_file = settings.game_state / "party_state.pkl"
+story_log_file = settings.game_state / "story_log.jsonl"
+story_index_file = settings.game_state / "story_log.idx"
+_OFFSET = struct.Struct("<Q")  # byte offset of each story line in the log
 
 def save_game_state(game_state=None, party=None):
     game_state_file.parent.mkdir(parents=True, exist_ok=True)
@@ -30,6 +34,101 @@ def delete_game_state():
         os.remove(game_state_file)
     if os.path.exists(party_file):
         os.remove(party_file)
+    reset_story_log()
+
+
+# ——— Story log —————————————————————————————————————————
+# The full story is kept in an append-only log with a fixed-width offset
+# index, so any page of it can be read without loading the whole history.
+
+def story_log_length() -> int:
+    if not os.path.exists(story_index_file):
+        return 0
+    return os.path.getsize(story_index_file) // _OFFSET.size
+
+
+def append_story_log(lines: List[str]) -> None:
+    story_log_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(story_log_file, 'ab') as log, open(story_index_file, 'ab') as index:
+        for line in lines:
+            index.write(_OFFSET.pack(log.tell()))
+            log.write((json.dumps(line) + "\n").encode("utf-8"))
+
+
+def read_story_log(start: int, stop: int) -> List[str]:
+    """
+    Story lines [start, stop) from the log.
+    """
+    length = story_log_length()
+    start, stop = max(start, 0), min(stop, length)
+    if start >= stop:
+        return []
+    with open(story_index_file, 'rb') as index:
+        index.seek(start * _OFFSET.size)
+        first = _OFFSET.unpack(index.read(_OFFSET.size))[0]
+        if stop < length:
+            index.seek(stop * _OFFSET.size)
+            end = _OFFSET.unpack(index.read(_OFFSET.size))[0]
+        else:
+            end = os.path.getsize(story_log_file)
+    with open(story_log_file, 'rb') as log:
+        log.seek(first)
+        data = log.read(end - first)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines()]
+
+
+def truncate_story_log(length: int) -> None:
+    if length >= story_log_length():
+        return
+    with open(story_index_file, 'r+b') as index:
+        index.seek(length * _OFFSET.size)
+        end = _OFFSET.unpack(index.read(_OFFSET.size))[0]
+        index.truncate(length * _OFFSET.size)
+    with open(story_log_file, 'r+b') as log:
+        log.truncate(end)
+
+
+def reset_story_log() -> None:
+    for file in (story_log_file, story_index_file):
+        if os.path.exists(file):
+            os.remove(file)
+
+
+def sync_story_log(game_state) -> None:
+    """
+    Bring the log in line with the game state. New lines only reach the log
+    this way, right before the state is saved, so the log never gets ahead of
+    the saved game. On load it drops lines of a save that did not finish and
+    backfills lines from states saved before the log existed.
+    """
+    total = game_state.story_offset + len(game_state.story)
+    length = story_log_length()
+    if length > total:
+        truncate_story_log(total)
+    elif length < total:
+        missing = min(total - length, len(game_state.story))
+        if missing < total - length:
+            logger.warning("Story log is missing %d lines that are no longer in memory", total - length - missing)
+        append_story_log(game_state.story[-missing:])
+
+
+def deep_sizeof(obj, seen=None) -> int:
+    """
+    Approximate memory held by an object and everything it references.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
 
 
 # ——— Context utilities —————————————————————————————————
@@ -40,3 +139,131 @@ def last_sentences(text: str, n: int) -> str:
     """
     sentences = re.split(r'(?<=[\.!?])\s+', text.strip())
     return " ".join(sentences[-n:])
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about four characters per token), good enough for prompt budgets.
+    """
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, budget: int, keep_end: bool = False) -> str:
+    """
+    Cut text down to roughly `budget` tokens on a word boundary.
+    """
+    limit = budget * 4
+    if len(text) <= limit:
+        return text
+    if keep_end:
+        cut = text[-limit:]
+        return cut.split(" ", 1)[-1]
+    return text[:limit].rsplit(" ", 1)[0]
+
+
+# ——— Streaming JSON utilities ————————————————————————————
+
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def _unicode_escape(buffer: str, i: int) -> int | None:
+    # Code point of the \uXXXX escape at i, None while it is still incomplete
+    if i + 6 > len(buffer):
+        return None
+    try:
+        return int(buffer[i + 2:i + 6], 16)
+    except ValueError:
+        return 0xFFFD
+
+
+def partial_json_string(buffer: str, key: str) -> str | None:
+    """
+    Decode the (possibly unterminated) string value of `key` from a partial
+    JSON object, so a field can be shown while the model is still streaming.
+    Returns None until the value has started.
+    """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(key), buffer)
+    if not match:
+        return None
+    out = []
+    i = match.end()
+    while i < len(buffer):
+        ch = buffer[i]
+        if ch == '"':
+            break
+        if ch == '\\':
+            if i + 1 >= len(buffer):
+                break
+            esc = buffer[i + 1]
+            if esc == 'u':
+                code = _unicode_escape(buffer, i)
+                if code is None:
+                    break
+                i += 6
+                if 0xD800 <= code < 0xDC00:
+                    # Characters outside the BMP (emoji) arrive as a surrogate pair
+                    if i + 6 > len(buffer):
+                        break
+                    low = _unicode_escape(buffer, i) if buffer.startswith('\\u', i) else -1
+                    if 0xDC00 <= low < 0xE000:
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        i += 6
+                elif not 0xDC00 <= code < 0xE000:
+                    out.append(chr(code))
+                # Unpaired surrogates cannot be encoded and are dropped
+                continue
+            out.append(_JSON_ESCAPES.get(esc, esc))
+            i += 2
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def repair_json(buffer: str) -> str:
+    """
+    Close any open string, array or object in truncated JSON output and drop
+    a dangling key or trailing comma, so whatever was generated can still be parsed.
+    """
+    text = buffer.strip()
+    start = text.find("{")
+    if start < 0:
+        return "{}"
+    text = text[start:]
+    stack = []
+    in_string = False
+    escaped = False
+    end = len(text)
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                end = i + 1
+                break
+    text = text[:end]
+    if not stack:
+        return text
+    if escaped:
+        text = text[:-1]
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # A key without a value cannot be closed, drop it along with its comma
+    if stack[-1] == "}":
+        dangling = re.search(r'([{,])\s*"[^"]*"\s*:?\s*$', text)
+        if dangling:
+            text = text[:dangling.start() + 1]
+    text = text.rstrip().rstrip(",")
+    return text + "".join(reversed(stack))
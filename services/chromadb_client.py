@@ -49,7 +49,7 @@ class ChromadbClient:
             model="sentence-transformers/all-MiniLM-L6-v2"
         )
         question_prompt = f"Formulate a question for a ChromaDB based on the following information, to retrieve more context. Only return the question: {question}"
-        question = ollama_client.generate(question_prompt)
+        question = ollama_client.generate(question_prompt, task="rewrite")
 
         retriever = ChromaEmbeddingRetriever(document_store=self.document_store)
         querying = Pipeline()
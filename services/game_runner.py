@@ -1,15 +1,19 @@
 import logging
-from typing import Dict
+from typing import Callable, Dict, Optional
 
 from core.models import GameState
+from core.utils import reset_story_log, delete_game_state
 from services.rag_utils import (
     generate_party_sync,
     start_adventure_sync,
     generate_options_sync,
     dm_turn_sync,
+    dm_turn_with_options_sync,
     ask_dm_sync
 )
+from core.settings import settings
 from services.chromadb_client import chromadb_client
+from services.summarizer import summarizer
 
 logger = logging.getLogger(__name__)
 
@@ -19,10 +23,19 @@ class GameRunner:
         self.party: Dict[str, object] | None = None
         self.state: GameState = GameState()
 
+    def delete_game(self) -> None:
+        # Let a running fold finish, it reads the story log being deleted
+        summarizer.wait()
+        delete_game_state()
+        self.party = None
+        self.state = GameState()
+
     def new_party(self) -> Dict[str, object]:
         # chromadb_client.clear_collection()
         self.party = generate_party_sync()
         self.state = GameState(turn=0, phase="start")
+        summarizer.wait()
+        reset_story_log()
         return self.party
 
     def start_adventure(self, custom_intro) -> GameState:
@@ -37,14 +50,19 @@ class GameRunner:
         self.state.intro_text = intro
         chromadb_client.embed(intro, f"intro")
 
-        self.state.story = [f"DM: {intro}"]
+        summarizer.wait()
+        reset_story_log()
+        self.state.story = []
+        self.state.story_offset = 0
+        self.state.story.append(f"DM: {intro}")
         return self.state
 
     def request_options(self) -> GameState:
         if self.state.phase not in ("intro", "dm_response"):
             raise RuntimeError("Cannot request options now.")
-        opts = generate_options_sync(self.state.__dict__)
-        self.state.current_options = opts
+        # Options may already have arrived together with the DM narration
+        if not self.state.current_options:
+            self.state.current_options = generate_options_sync(self.state.__dict__)
         self.state.phase = "choice"
         return self.state
 
@@ -59,14 +77,22 @@ class GameRunner:
         self.state.last_choice = choice
         chromadb_client.embed(f"Player: {choice}", f"player_turn_{self.state.turn}")
         self.state.story.append(f"Player: {choice}")
+        self.state.current_options = []
         self.state.phase = "dm_response"
         return self.state
 
-    def run_dm_turn(self) -> GameState:
-        dm_text = dm_turn_sync(self.state.__dict__)
+    def run_dm_turn(self, on_narration: Optional[Callable[[str], None]] = None) -> GameState:
+        if settings.combined_turn:
+            turn = dm_turn_with_options_sync(self.state.__dict__, on_narration=on_narration)
+            dm_text = turn.narration
+            self.state.current_options = turn.options
+        else:
+            dm_text = dm_turn_sync(self.state.__dict__)
         chromadb_client.embed(dm_text, f"dm_turn_{self.state.turn}")
         self.state.story.append(f"DM: {dm_text}")
         self.state.turn += 1
+        # Fold older turns into summaries and trim memory off the interactive path
+        summarizer.schedule(self.state)
         return self.state
 
     def ask_dm(self, question: str) -> str:
@@ -0,0 +1,340 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+import httpx
+from ollama import Client
+from ollama._types import ResponseError
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 100  # latencies kept per host for the percentile stats
+EWMA_ALPHA = 0.2
+
+
+def normalize_model(name: str) -> str:
+    """
+    Ollama reports untagged models as `name:latest`, compare them that way.
+    """
+    return name if ":" in name.rsplit("/", 1)[-1] else f"{name}:latest"
+
+
+def is_host_failure(exc: BaseException) -> bool:
+    """
+    Errors that say something about the host rather than the request.
+    A 4xx (unknown model, bad request) would fail on every host alike.
+    """
+    if isinstance(exc, ResponseError):
+        return exc.status_code is None or exc.status_code < 0 or exc.status_code >= 500
+    return isinstance(exc, (httpx.TransportError, OSError))
+
+
+class OllamaHost:
+    """
+    One Ollama server in the pool with its circuit breaker and latency stats.
+    """
+
+    def __init__(self, url: str, client: Any, failure_threshold: int, cooldown: float):
+        self.url = url
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.outstanding = 0
+        self.loaded: Optional[Set[str]] = None  # None until the first successful probe
+        self.healthy = True
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self.requests = 0
+        self.errors = 0
+        self.ewma: Optional[float] = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    # ——— Circuit breaker ————————————————————————————————————
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def available(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return self.healthy
+        # Half-open lets a single trial request through
+        return state == "half-open" and not self.trial_running
+
+    def record_success(self, latency: float) -> None:
+        self.requests += 1
+        self.latencies.append(latency)
+        self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+        self.failures = 0
+        self.opened_at = None
+        self.healthy = True
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Opening circuit for Ollama host %s", self.url)
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not ordered:
+                return None
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            "url": self.url,
+            "state": self.state,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ewma_latency": self.ewma,
+            "p50_latency": percentile(0.5),
+            "p95_latency": percentile(0.95),
+            "loaded_models": sorted(self.loaded) if self.loaded is not None else None,
+        }
+
+
+class HostPool:
+    """
+    Spreads requests over several Ollama hosts. Picks the available host with
+    the fewest outstanding requests, breaking ties towards hosts that already
+    hold the model, and never sends a model to a host without a free slot
+    while another host has one. Fails over to the next host on errors and
+    can hedge short calls.
+    """
+
+    def __init__(
+            self,
+            urls: Sequence[str],
+            client_factory: Callable[[str], Any] = None,
+            failure_threshold: int = 3,
+            cooldown: float = 30.0,
+            health_interval: float = 15.0,
+            hedge_delay: float = 0.5,
+            max_loaded: int = 2,
+            probe_timeout: float = 5.0,
+    ):
+        if not urls:
+            raise ValueError("HostPool needs at least one host.")
+        if client_factory is None:
+            client_factory = lambda url: Client(host=url)
+        self.hosts = [OllamaHost(url, client_factory(url), failure_threshold, cooldown) for url in urls]
+        self.health_interval = health_interval
+        self.hedge_delay = hedge_delay
+        self.max_loaded = max_loaded
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.hosts)),
+                                            thread_name_prefix="ollama-pool")
+        # Probes get their own workers, so a stalled host never holds up requests
+        self._probe_executor = ThreadPoolExecutor(max_workers=len(self.hosts), thread_name_prefix="ollama-probe")
+        self._probes: Dict[str, Future] = {}
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ——— Health probing ————————————————————————————————————
+
+    def probe(self, host: OllamaHost) -> None:
+        """
+        Ask a host which models it has loaded; doubles as the health check.
+        """
+        try:
+            loaded = {normalize_model(m.model) for m in host.client.ps().models}
+        except Exception as e:
+            logger.debug("Health probe failed for %s: %s", host.url, e)
+            with self._lock:
+                host.healthy = False
+            return
+        with self._lock:
+            host.healthy = True
+            host.loaded = loaded
+            if host.state == "closed":
+                host.failures = 0
+
+    def probe_all(self) -> None:
+        """
+        Probe every host in parallel. A host that has not answered within
+        `probe_timeout` is marked unhealthy; a probe still hanging from an
+        earlier round is waited on rather than started again.
+        """
+        probes = {}
+        for host in self.hosts:
+            probe = self._probes.get(host.url)
+            if probe is None or probe.done():
+                probe = self._probes[host.url] = self._probe_executor.submit(self.probe, host)
+            probes[probe] = host
+        _, stalled = wait(probes, timeout=self.probe_timeout)
+        for probe in stalled:
+            host = probes[probe]
+            logger.debug("Health probe timed out for %s", host.url)
+            with self._lock:
+                host.healthy = False
+
+    def start(self) -> None:
+        """
+        Start the background health checker, if enabled and not yet running.
+        """
+        if self.health_interval <= 0 or (self._health_thread and self._health_thread.is_alive()):
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _health_loop(self) -> None:
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.health_interval)
+
+    # ——— Host selection ————————————————————————————————————
+
+    def _fits(self, host: OllamaHost, model: str) -> bool:
+        # Hosts that were never probed count as having room
+        return host.loaded is None or model in host.loaded or len(host.loaded) < self.max_loaded
+
+    def can_serve(self, model: str) -> bool:
+        """
+        True if some host holds `model` or has a free slot to load it.
+        """
+        model = normalize_model(model)
+        with self._lock:
+            hosts = [h for h in self.hosts if h.available()] or self.hosts
+            return any(self._fits(h, model) for h in hosts)
+
+    def _ranked(self, model: Optional[str], exclude: Set[str]) -> List[OllamaHost]:
+        candidates = [h for h in self.hosts if h.url not in exclude and h.available()]
+        if not candidates:
+            # Everything is tripped: try the host whose breaker opened longest ago
+            candidates = sorted((h for h in self.hosts if h.url not in exclude),
+                                key=lambda h: h.opened_at or 0.0)[:1]
+        if not model:
+            return sorted(candidates, key=lambda h: (h.outstanding, h.ewma or 0.0))
+        model = normalize_model(model)
+        # Loading the model on a full host would evict another one
+        candidates = [h for h in candidates if self._fits(h, model)] or candidates
+        return sorted(candidates, key=lambda h: (
+            h.outstanding,
+            not (h.loaded is not None and model in h.loaded),
+            h.ewma or 0.0,
+        ))
+
+    def _acquire(self, model: Optional[str], tried: Set[str]) -> OllamaHost:
+        self.start()
+        with self._lock:
+            ranked = self._ranked(model, tried)
+            if not ranked:
+                raise ConnectionError("No Ollama host available.")
+            host = ranked[0]
+            host.outstanding += 1
+            if host.state == "half-open":
+                host.trial_running = True
+            tried.add(host.url)
+            return host
+
+    def _release(self, host: OllamaHost, model: Optional[str], started: float, error: BaseException = None) -> None:
+        with self._lock:
+            host.outstanding -= 1
+            host.trial_running = False
+            if error is None:
+                host.record_success(time.monotonic() - started)
+                if model and host.loaded is not None:
+                    host.loaded.add(normalize_model(model))
+            elif is_host_failure(error):
+                host.record_failure()
+
+    def stream(self, fn: Callable[[OllamaHost], Iterable], model: Optional[str] = None) -> Iterator:
+        """
+        Yield from `fn(host)` on the best host. Fails over to the next host on
+        host errors until the first item arrives; after that a partially
+        consumed stream cannot be replayed and the error is raised.
+        """
+        tried: Set[str] = set()
+        while True:
+            host = self._acquire(model, tried)
+            started = time.monotonic()
+            yielded = False
+            try:
+                for item in fn(host):
+                    yielded = True
+                    yield item
+            except BaseException as e:
+                self._release(host, model, started, e)
+                if yielded or not isinstance(e, Exception) or not is_host_failure(e) or len(tried) >= len(self.hosts):
+                    raise
+                logger.warning("Ollama host %s failed (%s), failing over", host.url, e)
+                continue
+            self._release(host, model, started)
+            return
+
+    # ——— Calls —————————————————————————————————————————————
+
+    def _run(self, host: OllamaHost, fn: Callable[[OllamaHost], Any], model: Optional[str]) -> Any:
+        started = time.monotonic()
+        try:
+            result = fn(host)
+        except BaseException as e:
+            self._release(host, model, started, e)
+            raise
+        self._release(host, model, started)
+        return result
+
+    def call(self, fn: Callable[[OllamaHost], Any], model: Optional[str] = None, hedge: bool = False) -> Any:
+        """
+        Run `fn(host)` on the best host, failing over to the others on host
+        errors. With `hedge`, a second host is raced once the first one has
+        not answered within `hedge_delay` seconds.
+        """
+        if hedge and len(self.hosts) > 1:
+            return self._hedged(fn, model)
+        tried: Set[str] = set()
+        while True:
+            host = self._acquire(model, tried)
+            try:
+                return self._run(host, fn, model)
+            except Exception as e:
+                if not is_host_failure(e) or len(tried) >= len(self.hosts):
+                    raise
+                logger.warning("Ollama host %s failed (%s), failing over", host.url, e)
+
+    def _hedged(self, fn: Callable[[OllamaHost], Any], model: Optional[str]) -> Any:
+        tried: Set[str] = set()
+        pending = {self._executor.submit(self._run, self._acquire(model, tried), fn, model)}
+        hedged = False
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged else self.hedge_delay,
+                                 return_when=FIRST_COMPLETED)
+            failed = False
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    if not is_host_failure(e):
+                        raise
+                    error, failed = e, True
+            # Launch a backup when the first host is slow, or replace a failed attempt
+            if (failed or not hedged) and len(tried) < len(self.hosts):
+                pending.add(self._executor.submit(self._run, self._acquire(model, tried), fn, model))
+            hedged = True
+        raise error
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [host.stats() for host in self.hosts]
@@ -1,7 +1,6 @@
 import logging
-from typing import Any, Dict, List
-from requests.exceptions import ConnectionError
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+from typing import Any, Dict, Iterator, List, Optional
+from tenacity import retry, Retrying, wait_exponential, stop_after_attempt, retry_if_exception
 from ollama import (
     Client,
     list as ollama_list_models,
@@ -13,19 +12,21 @@ from ollama import (
     delete as ollama_delete,
     ps as ollama_ps,
 )
-from ollama._types import ResponseError
 from haystack_integrations.components.generators.ollama import OllamaGenerator, OllamaChatGenerator
 
-from core.settings import settings
+from core.settings import settings, TaskModel
+from .host_pool import HostPool, is_host_failure, normalize_model
 
 logger = logging.getLogger(__name__)
 
-_retry = retry(
-    retry=retry_if_exception_type((ResponseError, ConnectionError)),
+# Only kicks in once every host in the pool has failed the request
+_RETRY_POLICY = dict(
+    retry=retry_if_exception(is_host_failure),
     wait=wait_exponential(min=1, max=5),
     stop=stop_after_attempt(3),
     reraise=True,
 )
+_retry = retry(**_RETRY_POLICY)
 
 
 class OllamaClient:
@@ -34,33 +35,117 @@ class OllamaClient:
     """
 
     def __init__(self):
-        self.client = Client(
-            host=settings.llm_host,
-            headers={'x-some-header': 'some-value'},
-
+        self.pool = HostPool(
+            settings.llm_hosts or [settings.llm_host],
+            client_factory=lambda url: Client(
+                host=url,
+                headers={'x-some-header': 'some-value'},
+                timeout=settings.llm_request_timeout,
+            ),
+            failure_threshold=settings.llm_breaker_failures,
+            cooldown=settings.llm_breaker_cooldown,
+            health_interval=settings.llm_health_interval,
+            hedge_delay=settings.llm_hedge_delay,
+            max_loaded=settings.llm_max_loaded_models,
+            probe_timeout=settings.llm_probe_timeout,
         )
 
+    # ——— Model routing ——————————————————————————————————————
+
+    def route(self, task: Optional[str] = None, fallback: bool = False) -> TaskModel:
+        """
+        Pick model, context size and options for a task. A task model that is
+        not loaded yet is only used if a host has a free slot for it; otherwise
+        the call goes to the main model rather than evicting it.
+        """
+        route = settings.task_model(task)
+        main = settings.task_model()
+        if fallback:
+            return main.model_copy(update={"options": route.options})
+        if normalize_model(route.model) == normalize_model(main.model):
+            return route
+        if not self.pool.can_serve(route.model):
+            logger.info("No free model slot for %s, routing task %s to %s", route.model, task, main.model)
+            return main.model_copy(update={"options": route.options})
+        return route
+
+    def has_fallback(self, task: str) -> bool:
+        """
+        Whether a bad answer for `task` can be retried on the main model, i.e.
+        the task is routed to a different model and allows falling back.
+        """
+        if not settings.task_model(task).fallback:
+            return False
+        return normalize_model(self.route(task).model) != normalize_model(settings.llm_model)
+
+    def _options(self, route: TaskModel, options: Optional[dict]) -> dict:
+        merged = dict(options or {})
+        merged.update(route.options)
+        merged["num_ctx"] = route.context_size
+        return merged
+
+    def host_stats(self) -> List[Dict[str, Any]]:
+        """
+        Per-host request counts, latency stats, breaker state and loaded models.
+        """
+        return self.pool.stats()
+
+    # ——— Calls ————————————————————————————————————————————
+
     @_retry
     def structured(self, messages: List[Dict[str, Any]], stream: bool = False, options: dict = None,
-                   output_format=None) -> Any:
-        if options is None:
-            options = {}
-        options.setdefault("num_ctx", settings.context_size)
-        response = self.client.chat(model=settings.llm_model,
-                                    messages=messages,
-                                    stream=stream,
-                                    options=options,
-                                    format=output_format)
+                   output_format=None, task: str = None, fallback: bool = False) -> Any:
+        route = self.route(task, fallback)
+        response = self.pool.call(
+            lambda host: host.client.chat(model=route.model,
+                                          messages=messages,
+                                          stream=stream,
+                                          options=self._options(route, options),
+                                          format=output_format,
+                                          keep_alive=route.keep_alive),
+            model=route.model,
+            hedge=task in settings.llm_hedge_tasks,
+        )
         return response['message']['content']
 
+    def structured_stream(self, messages: List[Dict[str, Any]], options: dict = None,
+                          output_format=None, task: str = None, fallback: bool = False) -> Iterator[str]:
+        """
+        Streaming variant of `structured`, yields content chunks as they arrive.
+        Retried like the other calls only until the first chunk: a partially
+        consumed stream cannot be replayed.
+        """
+        route = self.route(task, fallback)
+        yielded = False
+        policy = dict(_RETRY_POLICY, retry=retry_if_exception(lambda e: not yielded and is_host_failure(e)))
+        for attempt in Retrying(**policy):
+            with attempt:
+                for chunk in self.pool.stream(
+                        lambda host: host.client.chat(model=route.model,
+                                                      messages=messages,
+                                                      stream=True,
+                                                      options=self._options(route, options),
+                                                      format=output_format,
+                                                      keep_alive=route.keep_alive),
+                        model=route.model,
+                ):
+                    yielded = True
+                    yield chunk['message']['content']
+
     @_retry
     def chat(self, messages: List[Dict[str, Any]], stream: bool = False, options: dict = None,
-             output_format=None) -> Any:
-        llm = OllamaChatGenerator(
-            model=settings.llm_model, url=settings.llm_host, response_format=output_format,
-            generation_kwargs={"num_ctx": settings.context_size}
-        )
-        result = llm.run(messages)
+             output_format=None, task: str = None, fallback: bool = False) -> Any:
+        route = self.route(task, fallback)
+
+        def run(host):
+            llm = OllamaChatGenerator(
+                model=route.model, url=host.url, response_format=output_format,
+                generation_kwargs=self._options(route, options), keep_alive=route.keep_alive,
+                timeout=settings.llm_request_timeout,
+            )
+            return llm.run(messages)
+
+        result = self.pool.call(run, model=route.model, hedge=task in settings.llm_hedge_tasks)
         return result["replies"][0]._content[0].text
 
     @_retry
@@ -71,16 +156,23 @@ class OllamaClient:
             max_tokens: int = 5000,
             temperature: float = 0.8,
             stream: bool = False,
+            task: str = None,
+            fallback: bool = False,
     ) -> Any:
-        generator = OllamaGenerator(model=settings.llm_model,
-                                    url=settings.llm_host,
-                                    generation_kwargs={
-                                        "num_predict": max_tokens,
-                                        "temperature": temperature,
-                                        "num_ctx": settings.context_size
-                                    })
-
-        return generator.run(prompt)["replies"][0]
+        route = self.route(task, fallback)
+
+        def run(host):
+            generator = OllamaGenerator(model=route.model,
+                                        url=host.url,
+                                        generation_kwargs=self._options(route, {
+                                            "num_predict": max_tokens,
+                                            "temperature": temperature,
+                                        }),
+                                        keep_alive=route.keep_alive,
+                                        timeout=settings.llm_request_timeout)
+            return generator.run(prompt)
+
+        return self.pool.call(run, model=route.model, hedge=task in settings.llm_hedge_tasks)["replies"][0]
 
     # def embed(self, inputs: List[str]) -> Any:
     #    response = self.client.embed(model=settings.llm_embedding_model, input=inputs)
@@ -1,12 +1,12 @@
 import json
 import logging
 import re
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 
 from pydantic import BaseModel, Field, ValidationError
 from tenacity import retry, stop_after_attempt, wait_fixed
 
-from core.utils import last_sentences
+from core.utils import last_sentences, partial_json_string, repair_json, estimate_tokens, truncate_to_tokens
 from services.ollama_client import ollama_client
 from core.settings import settings
 from .chromadb_client import chromadb_client
@@ -56,6 +56,19 @@ PLAYER_PROMPT = (
 PLAYER_MAX = 150
 PLAYER_TEMP = 0.6
 
+CHAPTER_PROMPT = (
+    "SYSTEM: You are the chronicler of a D&D campaign. Summarize the following part of the adventure "
+    "in at most 120 words. Keep names, places, items, open quests and consequences of player choices.\n"
+    "USER: {events}"
+)
+ARC_PROMPT = (
+    "SYSTEM: You are the chronicler of a D&D campaign. Merge the story so far and the new chapters "
+    "into one summary of at most 250 words. Keep the main plot, important characters and open threads.\n"
+    "USER: Story so far: {arc}\nNew chapters: {chapters}"
+)
+SUMMARY_MAX = 400
+SUMMARY_TEMP = 0.3
+
 
 def dm_question_prompt(question: str = None, context: str = None) -> dict:
     return [
@@ -87,6 +100,27 @@ def create_options_prompt(context):
 
 OPTIONS_MAX = 150
 OPTIONS_TEMP = 0.6
+OPTIONS_COUNT = 3
+DEFAULT_OPTIONS = ["Continue forward", "Inspect surroundings", "Rest and recover"]
+
+
+# ——— Combined turn schema ——————————————————————————————————
+
+class DMTurn(BaseModel):
+    narration: str
+    options: List[str]
+
+
+def create_dm_turn_prompt(context):
+    return [
+        {'role': 'system',
+         'content': "You are the Dungeon Master. Continue the narrative (150–250 words), "
+                    "summarizing what happened and presenting the next challenge. "
+                    "Then offer the players possible actions. Reply as one JSON object with the keys "
+                    f"narration and options, where options holds exactly {OPTIONS_COUNT} short action options."},
+        {'role': 'user',
+         'content': context}
+    ]
 
 
 # ——— Character generation with retry ——————————————————————
@@ -103,18 +137,22 @@ def generate_character_sync() -> Character:
 
     # messages = [ChatMessage.from_user("CHAR_PROMPT")]
     messages = [{'role': 'user', 'content': CHAR_PROMPT}]
-    js = ollama_client.structured(
-        messages=messages,
-        options={"temperature": CHAR_TEMP},
-        output_format=Char.model_json_schema(),
-    )
-
-    try:
-        data = json.loads(js)
-        return Character.model_validate(data)
-    except (json.JSONDecodeError, ValidationError) as e:
-        logger.warning("Parse error (retrying): %s\nRaw: %s", e, js)
-        raise
+    fallbacks = (False, True) if ollama_client.has_fallback("character") else (False,)
+    for fallback in fallbacks:
+        js = ollama_client.structured(
+            messages=messages,
+            options={"temperature": CHAR_TEMP},
+            output_format=Char.model_json_schema(),
+            task="character",
+            fallback=fallback,
+        )
+        try:
+            return Character.model_validate(json.loads(js))
+        except (json.JSONDecodeError, ValidationError) as e:
+            if fallback or len(fallbacks) == 1:
+                logger.warning("Parse error (retrying): %s\nRaw: %s", e, js)
+                raise
+            logger.warning("Parse error (falling back to main model): %s\nRaw: %s", e, js)
 
 
 def generate_party_sync() -> Dict[str, Character]:
@@ -130,7 +168,8 @@ def start_adventure_sync(party: Dict[str, Character]) -> str:
     return ollama_client.generate(
         prompt=prompt,
         max_tokens=DM_MAX,
-        temperature=DM_TEMP
+        temperature=DM_TEMP,
+        task="intro",
     )
 
 
@@ -146,6 +185,45 @@ def player_turn_sync(state: Dict, name: str, info: Character) -> str:
     return ollama_client.generate(prompt=prompt, max_tokens=PLAYER_MAX, temperature=PLAYER_TEMP)
 
 
+# ——— Rolling summaries ——————————————————————————————————
+
+def summarize_chapter_sync(lines: List[str]) -> str:
+    prompt = CHAPTER_PROMPT.format(events="\n".join(lines))
+    return ollama_client.generate(prompt=prompt, max_tokens=SUMMARY_MAX, temperature=SUMMARY_TEMP, task="summary")
+
+
+def summarize_arc_sync(arc: Optional[str], chapters: List[str]) -> str:
+    prompt = ARC_PROMPT.format(arc=arc or "The adventure has just begun.", chapters="\n".join(chapters))
+    return ollama_client.generate(prompt=prompt, max_tokens=SUMMARY_MAX, temperature=SUMMARY_TEMP, task="summary")
+
+
+def story_summary(state: Dict, budget: int = None) -> str:
+    """
+    Arc summary plus the chapters not yet folded into it, newest chapters
+    first in line for the budget, so the prompt size stays bounded.
+    """
+    if budget is None:
+        budget = settings.summary_token_budget
+    arc = state.get("arc_summary") or ""
+    if arc:
+        # The end of the arc is the most recent part of the story
+        arc = truncate_to_tokens(arc, budget // 2, keep_end=True)
+        budget -= estimate_tokens(arc)
+    chapters = []
+    for chapter in reversed(state.get("chapters", [])[state.get("arc_chapters", 0):]):
+        cost = estimate_tokens(chapter)
+        if cost > budget:
+            break
+        chapters.insert(0, chapter)
+        budget -= cost
+    parts = []
+    if arc:
+        parts.append(f"Story so far: {arc}")
+    if chapters:
+        parts.append("Recent chapters: " + " | ".join(chapters))
+    return "\n".join(parts)
+
+
 def ask_dm_sync(state: Dict, question: str) -> str:
     recent = last_sentences(" ".join(state["story"]), 10)
     lore = chromadb_client.retrieve(question)
@@ -153,8 +231,11 @@ def ask_dm_sync(state: Dict, question: str) -> str:
         ctxt = f"Recent events: {recent}\nAdditional Backstory: {' | '.join(lore)}"
     else:
         ctxt = f"Recent events: {recent}"
+    summary = story_summary(state)
+    if summary:
+        ctxt = f"{summary}\n{ctxt}"
     prompt = dm_question_prompt(question=question, context=ctxt)
-    answer = ollama_client.chat(messages=prompt, options={"max_tokens": 2000, "temperature": 0.8})
+    answer = ollama_client.chat(messages=prompt, options={"num_predict": 2000, "temperature": 0.8}, task="ask_dm")
     return answer
 
 
@@ -167,8 +248,11 @@ def dm_turn_sync(state: Dict) -> str:
         ctxt = f"Recent events: {recent}\nAdditional Backstory: {' | '.join(lore)}"
     else:
         ctxt = f"Recent events: {recent}"
+    summary = story_summary(state)
+    if summary:
+        ctxt = f"{summary}\n{ctxt}"
     prompt = DM_TURN_PROMPT.format(context=ctxt)
-    return ollama_client.generate(prompt=prompt, max_tokens=DM_MAX, temperature=DM_TEMP)
+    return ollama_client.generate(prompt=prompt, max_tokens=DM_MAX, temperature=DM_TEMP, task="dm_turn")
 
 
 def generate_options_sync(state: Dict) -> List[str]:
@@ -179,13 +263,86 @@ def generate_options_sync(state: Dict) -> List[str]:
     ctxt = f"Recent events: {recent}"
     prompt = create_options_prompt(ctxt)
 
-    js = ollama_client.structured(
-        messages=prompt, output_format=Choices.model_json_schema()
-    )
+    # A short list is padded with defaults, only an unusable answer goes to the main model
+    fallbacks = (False, True) if ollama_client.has_fallback("options") else (False,)
+    for fallback in fallbacks:
+        js = ollama_client.structured(
+            messages=prompt, output_format=Choices.model_json_schema(), task="options", fallback=fallback
+        )
+        try:
+            opts = complete_options(json.loads(repair_json(js)).get("choice") or [])
+        except json.JSONDecodeError:
+            logger.error("Options parse error, raw: %s", js)
+            opts = []
+        if opts:
+            return opts
+    return list(DEFAULT_OPTIONS)
+
+
+def complete_options(opts: List) -> List[str]:
+    """
+    Clean up model supplied options and pad them with defaults, so a truncated
+    or partial answer never costs another round trip. Returns an empty list
+    when no real option came back, so proper options get generated instead.
+    """
+    cleaned = []
+    for opt in opts:
+        if isinstance(opt, str) and opt.strip() and opt.strip() not in cleaned:
+            cleaned.append(opt.strip())
+    if not cleaned:
+        return []
+    for opt in DEFAULT_OPTIONS:
+        if len(cleaned) >= OPTIONS_COUNT:
+            break
+        if opt not in cleaned:
+            cleaned.append(opt)
+    return cleaned[:OPTIONS_COUNT]
+
+
+def dm_turn_with_options_sync(state: Dict, on_narration: Optional[Callable[[str], None]] = None) -> DMTurn:
+    """
+    Narrate the DM turn and offer the next options in a single structured call.
+    The JSON is parsed while streaming so `on_narration` receives the narration
+    as it grows, before the options have been generated.
+    """
+    recent = last_sentences(" ".join(state["story"]), 10)
+    lore = chromadb_client.retrieve(recent)
+    if lore:
+        ctxt = f"Recent events: {recent}\nAdditional Backstory: {' | '.join(lore)}"
+    else:
+        ctxt = f"Recent events: {recent}"
+    summary = story_summary(state)
+    if summary:
+        ctxt = f"{summary}\n{ctxt}"
+    prompt = create_dm_turn_prompt(ctxt)
+
+    buffer = ""
+    shown = ""
+    for chunk in ollama_client.structured_stream(
+            messages=prompt,
+            options={"num_predict": DM_MAX, "temperature": DM_TEMP},
+            output_format=DMTurn.model_json_schema(),
+            task="dm_turn",
+    ):
+        buffer += chunk
+        narration = partial_json_string(buffer, "narration")
+        if on_narration and narration and narration != shown:
+            shown = narration
+            on_narration(narration)
 
     try:
-        opts = json.loads(js)
-    except Exception:
-        logger.error("Options parse error, raw: %s", js)
-    return opts["choice"]
-    # return ["Continue forward", "Inspect surroundings", "Rest and recover"]
+        data = json.loads(repair_json(buffer))
+    except json.JSONDecodeError:
+        # Keep whatever narration was already streamed to the player
+        logger.error("DM turn parse error, raw: %s", buffer)
+        data = {"narration": partial_json_string(buffer, "narration")}
+    narration = data.get("narration") if isinstance(data.get("narration"), str) else ""
+    narration = narration.strip()
+    if not narration:
+        # Nothing usable came back, fall back to the plain narration call
+        logger.warning("DM turn without narration, falling back. Raw: %s", buffer)
+        narration = dm_turn_sync(state)
+        if on_narration:
+            on_narration(narration)
+    options = data.get("options") if isinstance(data.get("options"), list) else []
+    return DMTurn(narration=narration, options=complete_options(options))
@@ -0,0 +1,102 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from core.models import GameState
+from core.settings import settings
+from core.utils import read_story_log, story_log_length
+from services.rag_utils import summarize_chapter_sync, summarize_arc_sync
+from services.chromadb_client import chromadb_client
+
+logger = logging.getLogger(__name__)
+
+LINES_PER_TURN = 2  # one player line and one DM line
+
+
+class Summarizer:
+    """
+    Folds every K turns of the story into a chapter summary and every M
+    chapters into the arc summary, then drops lines that are no longer needed
+    from memory. Runs on a single background worker so the interactive turn
+    never waits for it. Results are applied to the state under `state_lock`,
+    which saving the game holds too, so a save never sees half an update.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self.state_lock = threading.RLock()
+
+    def schedule(self, state: GameState) -> None:
+        """
+        Queue a fold for `state` unless one is already queued or running.
+        """
+        with self._lock:
+            if self._pending and not self._pending.done():
+                return
+            self._pending = self._executor.submit(self._fold, state)
+
+    def wait(self, timeout: float = None) -> None:
+        """
+        Block until the queued fold is done, e.g. before saving the game.
+        """
+        pending = self._pending
+        if pending:
+            pending.result(timeout=timeout)
+
+    def _fold(self, state: GameState) -> None:
+        try:
+            if settings.enable_summaries:
+                self.fold_chapters(state)
+                self.fold_arc(state)
+        except Exception:
+            # The next turn schedules the same work again
+            logger.exception("Summarizing the story failed")
+        self.trim(state)
+
+    def fold_chapters(self, state: GameState) -> None:
+        while True:
+            start = state.summarized_lines
+            # The first chapter also takes the intro line, so chapters end on a DM line
+            end = start + settings.summary_turns * LINES_PER_TURN + (1 if start == 0 else 0)
+            # Leave the latest turn out, the prompts already see it verbatim;
+            # lines that are not saved to the story log yet cannot be read
+            if min(state.story_length, story_log_length()) - end < LINES_PER_TURN:
+                return
+            chapter = summarize_chapter_sync(read_story_log(start, end)).strip()
+            chromadb_client.embed(f"Chapter {len(state.chapters) + 1}: {chapter}",
+                                  f"chapter_{len(state.chapters) + 1}")
+            with self.state_lock:
+                state.chapters.append(chapter)
+                state.summarized_lines = end
+
+    def fold_arc(self, state: GameState) -> None:
+        while len(state.chapters) - state.arc_chapters >= settings.summary_chapters:
+            end = state.arc_chapters + settings.summary_chapters
+            arc = summarize_arc_sync(state.arc_summary, state.chapters[state.arc_chapters:end]).strip()
+            chromadb_client.embed(f"Story so far: {arc}", f"arc_{end}")
+            with self.state_lock:
+                state.arc_summary = arc
+                state.arc_chapters = end
+
+    def trim(self, state: GameState) -> None:
+        """
+        Drop story lines beyond the in-memory window. They stay readable from
+        the story log; lines still waiting for a chapter or for the next save
+        are kept.
+        """
+        with self.state_lock:
+            keep_from = state.story_length - max(settings.story_memory_lines, LINES_PER_TURN)
+            if settings.enable_summaries:
+                keep_from = min(keep_from, state.summarized_lines)
+            # Lines not saved to the story log yet would be lost
+            keep_from = min(keep_from, story_log_length())
+            drop = keep_from - state.story_offset
+            if drop > 0:
+                del state.story[:drop]
+                state.story_offset += drop
+
+
+summarizer = Summarizer()
@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+
+# Keep game state, index and uploads of the test run out of the working tree
+_data = tempfile.mkdtemp(prefix="dnd-llm-gm-tests-")
+for key in ("GAME_STATE", "CHROMADB_FOLDER", "PDF_FOLDER", "VECTOR_INDEX_DIR"):
+    os.environ[key] = os.path.join(_data, key.lower())
+os.environ["LLM_HEALTH_INTERVAL"] = "0"
+
+
+@pytest.fixture
+def story_log():
+    """
+    An empty story log in the temporary game state folder.
+    """
+    from core.utils import reset_story_log
+    reset_story_log()
+    yield
+    reset_story_log()
@@ -0,0 +1,196 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from services.host_pool import HostPool, normalize_model
+
+
+class StandInClient:
+    """
+    Stands in for an Ollama client: `chat` runs the behaviour set by the test.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.loaded = []
+        self.behaviour = lambda: self.url
+
+    def ps(self):
+        return SimpleNamespace(models=[SimpleNamespace(model=m) for m in self.loaded])
+
+    def chat(self):
+        return self.behaviour()
+
+
+def make_pool(n=3, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    pool = HostPool([f"http://host-{i}" for i in range(n)], client_factory=StandInClient, **kwargs)
+    return pool, [host.client for host in pool.hosts]
+
+
+def refuse():
+    raise ConnectionError("connection refused")
+
+
+def run_concurrently(pool, count, model=None):
+    # Every call blocks until all of them have been placed on a host
+    release = threading.Event()
+    for host in pool.hosts:
+        client = host.client
+        client.behaviour = lambda client=client: (release.wait(5), client.url)[1]
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(pool.call, lambda h: h.client.chat(), model) for _ in range(count)]
+        deadline = time.monotonic() + 5
+        while sum(h.outstanding for h in pool.hosts) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+    return {host.url: results.count(host.url) for host in pool.hosts}
+
+
+def test_least_outstanding_spreads_load_even_when_one_host_holds_the_model():
+    pool, clients = make_pool()
+    clients[0].loaded = ["m:latest"]
+    pool.probe_all()
+    assert set(run_concurrently(pool, 9, model="m").values()) == {3}
+
+
+def test_transient_failure_does_not_starve_a_host():
+    pool, clients = make_pool()
+    clients[0].behaviour = refuse
+    assert pool.call(lambda h: h.client.chat()) != "http://host-0"
+    assert pool.hosts[0].failures == 1
+    assert run_concurrently(pool, 9)["http://host-0"] == 3
+
+
+def test_successful_probe_resets_failures():
+    pool, clients = make_pool()
+    pool.hosts[0].failures = 1
+    pool.probe_all()
+    assert pool.hosts[0].failures == 0
+
+
+def test_stalled_probe_does_not_hold_up_the_other_hosts():
+    pool, clients = make_pool(probe_timeout=0.1)
+    release = threading.Event()
+    calls = []
+    clients[0].ps = lambda: (calls.append(1), release.wait(5), SimpleNamespace(models=[]))[2]
+    clients[1].loaded = ["m:latest"]
+    started = time.monotonic()
+    pool.probe_all()
+    assert time.monotonic() - started < 0.5
+    assert [h.healthy for h in pool.hosts] == [False, True, True]
+    assert pool.hosts[1].loaded == {"m:latest"}
+    # The hanging probe is not started a second time
+    pool.probe_all()
+    assert len(calls) == 1
+    assert pool.call(lambda h: h.client.chat()) != "http://host-0"
+    release.set()
+
+
+def test_model_prefers_host_with_it_loaded_when_idle():
+    pool, clients = make_pool()
+    clients[2].loaded = ["m:latest"]
+    pool.probe_all()
+    assert pool.call(lambda h: h.client.chat(), model="m") == "http://host-2"
+
+
+def test_model_is_not_sent_to_a_full_host():
+    pool, clients = make_pool(n=2, max_loaded=1)
+    clients[0].loaded = ["other:latest"]
+    pool.probe_all()
+    assert pool.can_serve("m")
+    for _ in range(3):
+        assert pool.call(lambda h: h.client.chat(), model="m") == "http://host-1"
+    clients[1].loaded = ["busy:latest"]
+    pool.probe_all()
+    assert not pool.can_serve("m")
+
+
+def test_failover_to_next_host():
+    pool, clients = make_pool(n=2)
+    clients[0].behaviour = refuse
+    clients[1].behaviour = refuse
+    pool.hosts[1].outstanding = 1  # make host-0 the first pick
+    with pytest.raises(ConnectionError):
+        pool.call(lambda h: h.client.chat())
+    pool.hosts[1].outstanding = 0
+    clients[1].behaviour = lambda: "ok"
+    assert pool.call(lambda h: h.client.chat()) == "ok"
+    assert [h["errors"] for h in pool.stats()] == [2, 1]
+
+
+def test_request_errors_do_not_fail_over():
+    pool, clients = make_pool(n=2)
+    clients[0].behaviour = lambda: (_ for _ in ()).throw(ValueError("bad request"))
+    clients[1].behaviour = clients[0].behaviour
+    with pytest.raises(ValueError):
+        pool.call(lambda h: h.client.chat())
+    assert sum(h.requests for h in pool.hosts) == 0
+
+
+def test_breaker_opens_half_opens_and_closes():
+    pool, clients = make_pool(n=2, failure_threshold=2, cooldown=0.2)
+    dead = pool.hosts[0]
+    clients[0].behaviour = refuse
+    for _ in range(2):
+        pool.hosts[1].outstanding = 1  # steer the call to the dead host
+        pool.call(lambda h: h.client.chat())
+        pool.hosts[1].outstanding = 0
+    assert dead.state == "open"
+    assert all(pool.call(lambda h: h.client.chat()) == "http://host-1" for _ in range(3))
+
+    time.sleep(0.25)
+    assert dead.state == "half-open"
+    pool.hosts[1].outstanding = 1
+    pool.call(lambda h: h.client.chat())  # failed trial
+    assert dead.state == "open"
+
+    time.sleep(0.25)
+    clients[0].behaviour = lambda: "recovered"
+    assert pool.call(lambda h: h.client.chat()) == "recovered"
+    assert dead.state == "closed"
+
+
+def test_hedged_call_returns_the_fast_host():
+    pool, clients = make_pool(n=2, hedge_delay=0.05)
+    clients[0].behaviour = lambda: (time.sleep(1), "slow")[1]
+    clients[1].behaviour = lambda: "fast"
+    pool.hosts[1].outstanding = 1  # the slow host is the first pick
+    started = time.monotonic()
+    assert pool.call(lambda h: h.client.chat(), hedge=True) == "fast"
+    assert time.monotonic() - started < 0.5
+
+
+def test_stream_fails_over_before_the_first_chunk_only():
+    pool, clients = make_pool(n=2)
+
+    def broken_stream():
+        raise ConnectionError("connection refused")
+        yield
+
+    clients[0].behaviour = broken_stream
+    clients[1].behaviour = lambda: iter(["a", "b"])
+    pool.hosts[1].outstanding = 1
+    assert list(pool.stream(lambda h: h.client.chat())) == ["a", "b"]
+    pool.hosts[1].outstanding = 0
+    assert all(h.outstanding == 0 for h in pool.hosts)
+
+    def dies_midway():
+        yield "a"
+        raise ConnectionError("reset")
+
+    clients[0].behaviour = dies_midway
+    clients[1].behaviour = dies_midway
+    with pytest.raises(ConnectionError):
+        list(pool.stream(lambda h: h.client.chat()))
+    assert sum(h.errors for h in pool.hosts) == 2
+
+
+def test_normalize_model():
+    assert normalize_model("gemma3") == "gemma3:latest"
+    assert normalize_model("gemma3:4b") == "gemma3:4b"
+    assert normalize_model("registry.local:5000/gemma3") == "registry.local:5000/gemma3:latest"
@@ -0,0 +1,136 @@
+import pytest
+
+from core.models import GameState
+from core.settings import settings
+from core.utils import append_story_log
+import services.summarizer as summarizer_module
+from services.rag_utils import story_summary
+from services.summarizer import Summarizer
+
+
+def make_story(turns):
+    # The intro line followed by a player and a DM line per turn
+    return ["DM: intro"] + [line for t in range(1, turns + 1) for line in (f"Player: act {t}", f"DM: result {t}")]
+
+
+@pytest.fixture
+def summaries(monkeypatch, story_log):
+    """
+    Records what gets summarized instead of calling the model.
+    """
+    calls = {"chapters": [], "arcs": []}
+
+    def chapter(lines):
+        calls["chapters"].append(lines)
+        return f"chapter of {len(lines)} lines"
+
+    def arc(previous, chapters):
+        calls["arcs"].append((previous, chapters))
+        return f"arc of {len(chapters)} chapters"
+
+    monkeypatch.setattr(summarizer_module, "summarize_chapter_sync", chapter)
+    monkeypatch.setattr(summarizer_module, "summarize_arc_sync", arc)
+    monkeypatch.setattr(summarizer_module.chromadb_client, "embed", lambda text, name: None)
+    monkeypatch.setattr(settings, "enable_summaries", True)
+    monkeypatch.setattr(settings, "summary_turns", 2)
+    monkeypatch.setattr(settings, "summary_chapters", 2)
+    monkeypatch.setattr(settings, "story_memory_lines", 4)
+    return calls
+
+
+def test_fold_chapters_takes_the_intro_and_leaves_the_latest_turn(summaries):
+    story = make_story(5)
+    append_story_log(story)
+    state = GameState(story=list(story))
+    Summarizer().fold_chapters(state)
+    # Chapter 1 is the intro plus two turns, chapter 2 two turns, the last turn stays verbatim
+    assert summaries["chapters"] == [story[0:5], story[5:9]]
+    assert state.chapters == ["chapter of 5 lines", "chapter of 4 lines"]
+    assert state.summarized_lines == 9
+
+
+def test_fold_chapters_waits_for_a_full_chapter(summaries):
+    story = make_story(2)
+    append_story_log(story)
+    state = GameState(story=list(story))
+    Summarizer().fold_chapters(state)
+    assert summaries["chapters"] == []
+    assert state.summarized_lines == 0
+
+
+def test_fold_arc_folds_whole_groups_of_chapters(summaries):
+    state = GameState(chapters=[f"c{i}" for i in range(5)])
+    Summarizer().fold_arc(state)
+    assert summaries["arcs"] == [(None, ["c0", "c1"]), ("arc of 2 chapters", ["c2", "c3"])]
+    assert state.arc_chapters == 4
+    assert state.arc_summary == "arc of 2 chapters"
+
+
+def test_trim_keeps_the_memory_window_and_unsummarized_lines(summaries):
+    story = make_story(5)
+    append_story_log(story)
+    state = GameState(story=list(story), summarized_lines=9)
+    Summarizer().trim(state)
+    assert state.story == story[7:]
+    assert state.story_offset == 7
+    assert state.story_length == len(story)
+
+    # Lines still waiting for a chapter are not dropped
+    state = GameState(story=list(story), summarized_lines=3)
+    Summarizer().trim(state)
+    assert state.story == story[3:]
+    assert state.story_offset == 3
+
+    # A second trim only drops what has been added since
+    state.summarized_lines = 9
+    Summarizer().trim(state)
+    assert state.story == story[7:]
+    assert state.story_offset == 7
+
+
+def test_trim_without_summaries_keeps_the_memory_window(summaries, monkeypatch):
+    monkeypatch.setattr(settings, "enable_summaries", False)
+    story = make_story(5)
+    append_story_log(story)
+    state = GameState(story=list(story))
+    Summarizer().trim(state)
+    assert state.story == story[-4:]
+    assert state.story_offset == len(story) - 4
+
+
+def test_lines_not_saved_to_the_log_are_neither_folded_nor_trimmed(summaries, monkeypatch):
+    monkeypatch.setattr(settings, "enable_summaries", False)
+    story = make_story(5)
+    append_story_log(story[:3])
+    state = GameState(story=list(story))
+    Summarizer().trim(state)
+    assert state.story == story[3:]
+    assert state.story_offset == 3
+
+    monkeypatch.setattr(settings, "enable_summaries", True)
+    state = GameState(story=list(story))
+    Summarizer().fold_chapters(state)
+    assert summaries["chapters"] == []
+
+
+def test_failed_summary_still_trims(summaries, monkeypatch):
+    def fail(lines):
+        raise ConnectionError("connection refused")
+
+    monkeypatch.setattr(summarizer_module, "summarize_chapter_sync", fail)
+    story = make_story(5)
+    append_story_log(story)
+    state = GameState(story=list(story))
+    summarizer = Summarizer()
+    summarizer.schedule(state)
+    summarizer.wait(5)
+    assert state.chapters == []
+    assert state.story_offset == 0
+    assert state.story == story
+
+
+def test_story_summary_keeps_the_end_of_a_long_arc():
+    arc = " ".join(f"event{i}" for i in range(200))
+    summary = story_summary({"arc_summary": arc, "chapters": ["old", "new"], "arc_chapters": 1}, budget=100)
+    assert "event199" in summary and "event0 " not in summary
+    assert "new" in summary and "old" not in summary
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from core.models import GameState
+from core.utils import (
+    append_story_log, partial_json_string, read_story_log, repair_json, story_log_length, sync_story_log,
+)
+
+
+# ——— Story log ————————————————————————————————————————————
+
+def test_story_log_reads_any_page(story_log):
+    lines = [f"DM: line {i}" for i in range(10)] + ["Player: caf\u00e9 \U0001F600", "DM: two\nlines"]
+    append_story_log(lines[:5])
+    append_story_log(lines[5:])
+    assert story_log_length() == len(lines)
+    assert read_story_log(0, len(lines)) == lines
+    assert read_story_log(3, 7) == lines[3:7]
+    assert read_story_log(10, 99) == lines[10:]
+    assert read_story_log(-5, 2) == lines[:2]
+    assert read_story_log(7, 7) == []
+
+
+def test_sync_story_log_writes_new_lines_of_a_trimmed_state(story_log):
+    state = GameState(story=["DM: intro", "Player: a"])
+    sync_story_log(state)
+    state.story.append("DM: b")
+    # Older lines have been trimmed from memory but are already in the log
+    del state.story[:2]
+    state.story_offset = 2
+    sync_story_log(state)
+    assert read_story_log(0, 99) == ["DM: intro", "Player: a", "DM: b"]
+    sync_story_log(state)
+    assert story_log_length() == 3
+
+
+def test_sync_story_log_drops_lines_of_an_unfinished_save(story_log):
+    saved = GameState(story=["DM: intro", "Player: a"])
+    append_story_log(saved.story + ["DM: b"])
+    sync_story_log(saved)
+    assert read_story_log(0, 99) == saved.story
+    # The next save appends at the right place again
+    saved.story.append("DM: c")
+    sync_story_log(saved)
+    assert read_story_log(0, 99) == ["DM: intro", "Player: a", "DM: c"]
+
+
+def test_sync_story_log_backfills_states_saved_before_the_log(story_log):
+    state = GameState(story=["DM: intro", "Player: a", "DM: b"])
+    sync_story_log(state)
+    assert read_story_log(0, 99) == state.story
+
+
+def test_loading_the_game_mid_turn_does_not_touch_the_log(story_log):
+    # One session is inside a DM turn while another loads the last save
+    playing = GameState(story=["DM: intro"])
+    sync_story_log(playing)
+    playing.story.append("Player: a")
+    loaded = GameState(story=["DM: intro"])
+    sync_story_log(loaded)
+    playing.story.append("DM: b")
+    sync_story_log(playing)
+    assert read_story_log(0, 99) == ["DM: intro", "Player: a", "DM: b"]
+
+
+# ——— Streaming JSON utilities ————————————————————————————
+
+@pytest.mark.parametrize("buffer, expected", [
+    ('{"narration": "The door cre', {"narration": "The door cre"}),
+    ('{"narration": "a\\"b", "opt', {"narration": 'a"b'}),
+    ('{"narration": "x", "options": ["a", "b', {"narration": "x", "options": ["a", "b"]}),
+    ('{"narration": "x", "options": ["a",', {"narration": "x", "options": ["a"]}),
+    ('{"narration": "x", "options": [', {"narration": "x", "options": []}),
+    ('{"narration": "x\\', {"narration": "x"}),
+    ('{"narration":', {}),
+    ('no json at all', {}),
+    ('{"narration": "x", "options": ["a"]} trailing text', {"narration": "x", "options": ["a"]}),
+])
+def test_repair_json_closes_truncated_output(buffer, expected):
+    assert json.loads(repair_json(buffer)) == expected
+
+
+@pytest.mark.parametrize("buffer", [
+    '{"narration": "The gate \\u00',
+    '{"narration": "Dark.", "options": ["a"], "done": tr',
+])
+def test_partial_json_string_recovers_what_repair_json_cannot(buffer):
+    with pytest.raises(json.JSONDecodeError):
+        json.loads(repair_json(buffer))
+    assert partial_json_string(buffer, "narration") in ("The gate ", "Dark.")
+
+
+@pytest.mark.parametrize("buffer, expected", [
+    ('{"options": [', None),
+    ('{"narration": "', ""),
+    ('{"narration": "Line\\nbreak and \\"quotes\\"', 'Line\nbreak and "quotes"'),
+    ('{"narration": "done", "options": []}', "done"),
+    ('{"narration": "caf\\u00e9', "café"),
+    ('{"narration": "cut \\u00', "cut "),
+    ('{"narration": "cut \\', "cut "),
+])
+def test_partial_json_string(buffer, expected):
+    assert partial_json_string(buffer, "narration") == expected
+
+
+def test_partial_json_string_combines_surrogate_pairs():
+    assert partial_json_string('{"narration": "hi \\ud83d\\ude00!"}', "narration") == "hi \U0001F600!"
+    # Wait for the low half instead of emitting a lone surrogate
+    for buffer in ('{"narration": "hi \\ud83d', '{"narration": "hi \\ud83d\\ude'):
+        text = partial_json_string(buffer, "narration")
+        assert text == "hi "
+        text.encode("utf-8")
+    # Unpaired surrogates are dropped so the text can always be encoded
+    text = partial_json_string('{"narration": "a\\ud83db\\ude00c"}', "narration")
+    assert text == "abc"
+    text.encode("utf-8")
@@ -14,12 +14,23 @@ from core.settings import settings
 from services.game_runner import GameRunner
 # from core.utils import build_index
 from services.chromadb_client import chromadb_client
+from services.ollama_client import ollama_client
+from services.summarizer import summarizer
 
 logger = logging.getLogger(__name__)
 st.set_page_config(page_title="AI Game Master", layout="wide")
-# Create an empty placeholder for the info message
-info_placeholder = st.empty()
-from core.utils import save_game_state, load_game_state, delete_game_state, game_state_file, party_file
+from core.utils import (
+    save_game_state, load_game_state, game_state_file, party_file,
+    story_log_length, read_story_log, sync_story_log, deep_sizeof,
+)
+
+
+def persist(runner: GameRunner):
+    # The summarizer may be updating the state in the background. New story
+    # lines are written to the log together with the save, never ahead of it.
+    with summarizer.state_lock:
+        sync_story_log(runner.state)
+        save_game_state(game_state=runner.state, party=runner.party)
 
 
 def display_party(party):
@@ -40,13 +51,30 @@ def display_party(party):
             st.write(data["backstory"][:200] + "...")
 
 
-def display_log(story):
+def change_log_page(step: int):
+    st.session_state.log_page = max(0, st.session_state.get("log_page", 0) + step)
+
+
+@st.fragment
+def display_log():
+    # Only the visible page is read from the story log, paging reruns just this fragment
     st.subheader("📜 Adventure Log")
-    embedding_list = []
-    for i, line in enumerate(story, start=1):
+    total = story_log_length()
+    page_size = settings.log_page_size
+    pages = max(1, -(-total // page_size))
+    page = min(st.session_state.get("log_page", 0), pages - 1)
+    st.session_state.log_page = page
+    stop = total - page * page_size
+    start = max(0, stop - page_size)
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    col1.button("⬅️ Older", on_click=change_log_page, args=(1,), disabled=page >= pages - 1)
+    col2.caption(f"Lines {start + 1 if total else 0}–{stop} of {total}")
+    col3.button("Newer ➡️", on_click=change_log_page, args=(-1,), disabled=page == 0)
+
+    for i, line in enumerate(read_story_log(start, stop), start=start + 1):
         if ":" in line:
             who, text = line.split(":", 1)
-            embedding_list.append(f"{who} : {text}")
             icon = "🧙‍♂️" if who.strip() == "DM" else "🎲"
             with st.expander(f"Turn {i} - {icon}"):
                 st.markdown(f"**{who}:** {text.strip()}")
@@ -54,47 +82,42 @@ def display_log(story):
             st.error(f"Invalid log entry at turn {i}: \n{line}")
 
 
-def main():
-    # init runner
-    if "runner" not in st.session_state:
-        st.session_state.runner = GameRunner()
-    runner: GameRunner = st.session_state.runner
-    gs = runner.state
-    if "loaded" not in st.session_state:
-        st.session_state.loaded = False
-        if os.path.exists(game_state_file):
-            gs = load_game_state(game_state_file)
-            runner.state = gs
-        if os.path.exists(party_file) and not runner.party:
-            runner.party = load_game_state(party_file)
-        st.session_state.loaded = True
+@st.fragment
+def ask_dm_panel(runner: GameRunner):
+    st.title("Ask DM")
+    question = st.chat_input("Enter your question:")
+    if question:
+        with st.spinner("Loading answer", show_time=True):
+            result = runner.ask_dm(question)
+        st.markdown(result)
 
-    ## Sidebar
-    # Create a question bar that is always present
-    with st.sidebar:
-        st.title("Ask DM")
-        question = st.chat_input("Enter your question:")
-        if question:
-            with st.spinner("Loading answer", show_time=True):
-                result = runner.ask_dm(question)
-            st.sidebar.markdown(result)
-    with st.sidebar.expander("Settings"):
+
+@st.fragment
+def sidebar_tools(runner: GameRunner):
+    with st.expander("Settings"):
+        task_lines = "".join(f"- **Model ({task}):** `{route.model}`\n"
+                             for task, route in settings.task_models.items() if route.model)
         st.markdown(f"- **Ollama Host:** `{settings.llm_host}`\n"
                     f"- **Model:** `{settings.llm_model}`\n"
+                    f"{task_lines}"
                     f"- **Turn Limit:** {settings.turn_limit}\n"
                     f"- **RAG:** {settings.enable_rag}")
+        session_bytes = deep_sizeof(dict(st.session_state))
+        logger.debug("Session memory: %d bytes", session_bytes)
+        st.caption(f"Session memory: {session_bytes / 1024:.1f} KiB")
         # Two colum layout for the load and save buttons
         col1, col2 = st.columns(2)
         with col1:
             if st.button('Save Game State'):
-                save_game_state(game_state=gs)
-                if runner.party:
-                    save_game_state(party=runner.party)
+                persist(runner)
         with col2:
             if st.button('Delete Game State'):
-                delete_game_state()
-                st.write("Game state deleted.")
-    with st.sidebar.expander("PDF"):
+                runner.delete_game()
+                st.toast("Game state deleted.")
+                st.rerun()
+    with st.expander("Ollama Hosts"):
+        st.dataframe(ollama_client.host_stats(), hide_index=True)
+    with st.expander("PDF"):
         # RAG PDF upload
         up = st.file_uploader("Upload PDFs for lore", accept_multiple_files=True, type="pdf")
         if up:
@@ -106,28 +129,23 @@ def main():
                     chromadb_client.embed_pdf(dst)
             st.success("PDF index built!")
 
-    st.title("🗡️ Virtual Game Master")
+
+@st.fragment
+def turn_controls(runner: GameRunner):
+    # Widget interaction only reruns this fragment; a changed game state reruns the app
+    gs = runner.state
 
     # Phase: start → new party
     if gs.phase == "start":
         if st.button("Generate Party"):
             try:
-                with info_placeholder.container():
-                    st.info("Generating Party...")
-                runner.new_party()
-
-                with info_placeholder.container():
-                    st.success("Party Generated")
-                save_game_state(game_state=gs)
-                if runner.party:
-                    save_game_state(party=runner.party)
+                with st.spinner("Generating Party..."):
+                    runner.new_party()
+                persist(runner)
             except Exception as e:
                 st.error(e)
-        # return  # re-render
-
-    # Show party once generated
-    if runner.party:
-        display_party(runner.party)
+            else:
+                st.rerun()
 
     # Phase: ready to start
     if gs.phase == "start" and runner.party:
@@ -138,20 +156,19 @@ def main():
         if st.button("🐉 Start Adventure"):
             try:
                 runner.start_adventure(custom_intro)
-                save_game_state(game_state=gs)
-                if runner.party:
-                    save_game_state(party=runner.party)
+                persist(runner)
             except Exception as e:
                 st.error(e)
+            else:
+                st.rerun()
 
     # Phase: intro text
     if gs.phase == "intro":
         st.markdown(f"**Intro:** {gs.intro_text}")
         if st.button("▶️ Continue"):
             runner.request_options()
-            save_game_state(game_state=gs)
-            if runner.party:
-                save_game_state(party=runner.party)
+            persist(runner)
+            st.rerun()
 
     # Phase: choice
     if gs.phase == "choice":
@@ -166,13 +183,15 @@ def main():
                     runner.process_player_choice(text=custom_text)
                 elif choice:
                     runner.process_player_choice(idx=opts.index(choice))
-                runner.run_dm_turn()
+                # Render the narration while the DM is still writing the options
+                narration_placeholder = st.empty()
+                runner.run_dm_turn(
+                    on_narration=lambda text: narration_placeholder.markdown(f"**DM:** {text}")
+                )
+                persist(runner)
+                st.rerun()
             else:
-                with info_placeholder.container():
-                    st.info("Select an option or write a custom text")
-            save_game_state(game_state=gs)
-            if runner.party:
-                save_game_state(party=runner.party)
+                st.info("Select an option or write a custom text")
 
     # Phase: DM response shown (and loop back to options)
     if gs.phase == "dm_response":
@@ -181,13 +200,40 @@ def main():
         st.markdown(f"**{who.strip()}:** {txt.strip()}")
         if st.button("▶️ Next Turn"):
             runner.request_options()
-            save_game_state(game_state=gs)
-            if runner.party:
-                save_game_state(party=runner.party)
-        # fall through to log
+            persist(runner)
+            st.rerun()
+
+
+def main():
+    # init runner
+    if "runner" not in st.session_state:
+        st.session_state.runner = GameRunner()
+    runner: GameRunner = st.session_state.runner
+    if "loaded" not in st.session_state:
+        st.session_state.loaded = False
+        if os.path.exists(game_state_file):
+            runner.state = load_game_state(game_state_file)
+            sync_story_log(runner.state)
+        if os.path.exists(party_file) and not runner.party:
+            runner.party = load_game_state(party_file)
+        st.session_state.loaded = True
+
+    ## Sidebar
+    # Create a question bar that is always present
+    with st.sidebar:
+        ask_dm_panel(runner)
+        sidebar_tools(runner)
+
+    st.title("🗡️ Virtual Game Master")
+
+    # Show party once generated
+    if runner.party:
+        display_party(runner.party)
+
+    turn_controls(runner)
 
     # Always show log at end
-    display_log(gs.story)
+    display_log()
 
 
 if __name__ == "__main__":